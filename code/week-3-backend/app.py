@@ -1,15 +1,18 @@
 import os
 import json
+import math
 import time
 import threading
 import boto3
 from datetime import datetime, timezone
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
 from flask_cors import CORS
 from dotenv import load_dotenv
 
 # Import our new logic module
 from gtfs import GTFSStaticRepository, TripEstimator
+from clusters import VehicleClusterIndex
+from route_stats import RouteStatsAggregator
 
 load_dotenv()
 
@@ -29,6 +32,7 @@ repo.initialize()
 
 # 2. Initialize Logic
 estimator = TripEstimator(repo)
+route_stats = RouteStatsAggregator()
 
 # 3. Global State (In-Memory Cache)
 LATEST_STATE = {
@@ -37,9 +41,13 @@ LATEST_STATE = {
     "vehicles": []
 }
 
+# Clusters for the latest snapshot. Rebuilt once per snapshot and swapped in whole,
+# so requests never see a half-built index.
+CLUSTER_INDEX = VehicleClusterIndex([])
+
 def handle_new_data(feed_data):
     """Callback for when we get a new batch of records from Kinesis."""
-    global LATEST_STATE
+    global LATEST_STATE, CLUSTER_INDEX
     
     # 1. Parse raw feed into basic vehicle objects
     raw_vehicles = []
@@ -79,6 +87,8 @@ def handle_new_data(feed_data):
     current_time = datetime.now(timezone.utc).isoformat()
     LATEST_STATE["generated_at"] = current_time
     LATEST_STATE["vehicles"] = processed_vehicles
+    CLUSTER_INDEX = VehicleClusterIndex(processed_vehicles, current_time)
+    route_stats.update(processed_vehicles)
     print(f"Updated {len(processed_vehicles)} vehicles at {current_time}.")
 
 def poll_kinesis():
@@ -128,6 +138,32 @@ threading.Thread(target=poll_kinesis, daemon=True).start()
 def get_vehicles():
     return jsonify(LATEST_STATE)
 
+@app.get("/api/vehicles/clusters")
+def get_vehicle_clusters():
+    # bbox follows Leaflet's toBBoxString(): "min_lon,min_lat,max_lon,max_lat"
+    try:
+        zoom = int(request.args.get("zoom", 11))
+    except ValueError:
+        return jsonify({"error": "zoom must be an integer"}), 400
+
+    bbox = None
+    bbox_str = request.args.get("bbox")
+    if bbox_str:
+        try:
+            bbox = tuple(float(part) for part in bbox_str.split(","))
+        except ValueError:
+            bbox = ()
+        if len(bbox) != 4 or not all(math.isfinite(part) for part in bbox):
+            return jsonify({"error": "bbox must be min_lon,min_lat,max_lon,max_lat"}), 400
+        if bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+            return jsonify({"error": "bbox min values must not exceed max values"}), 400
+
+    return jsonify(CLUSTER_INDEX.query(zoom, bbox))
+
+@app.get("/api/routes/summary")
+def get_routes_summary():
+    return jsonify(route_stats.summary())
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
 
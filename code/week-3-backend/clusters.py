@@ -0,0 +1,129 @@
+import math
+
+# Zoom levels we precompute clusters for. Anything past MAX_ZOOM is close enough
+# that the map should just draw the individual vehicles from /api/vehicles.
+MIN_ZOOM = 8
+MAX_ZOOM = 15
+
+# Each Web Mercator tile is split into CELLS_PER_TILE x CELLS_PER_TILE grid cells,
+# so a cell is roughly 64px on screen at every zoom level.
+CELLS_PER_TILE = 4
+
+STATUSES = ('LATE', 'ON_TIME', 'EARLY', 'UNKNOWN')
+
+MAX_MERCATOR_LAT = 85.05112878
+
+
+class VehicleClusterIndex:
+    """
+    Hierarchical grid of vehicle clusters for a single published snapshot.
+
+    Vehicles are bucketed once into cells at MAX_ZOOM, then each coarser zoom level is
+    built by merging the four child cells of the level below it. After that a request
+    only has to slice the cells that fall inside its bounding box.
+    """
+    def __init__(self, vehicles, generated_at=None):
+        self.generated_at = generated_at
+        self.levels = {}
+        self._build(vehicles)
+
+    def _build(self, vehicles):
+        finest = {}
+        for v in vehicles:
+            lat = v.get('lat')
+            lon = v.get('lon')
+            if not isinstance(lat, (int, float)) or not isinstance(lon, (int, float)):
+                continue
+
+            key = self._cell_for(lat, lon, MAX_ZOOM)
+            cell = finest.get(key)
+            if cell is None:
+                cell = finest[key] = self._empty_cell()
+            self._add_vehicle(cell, v, lat, lon)
+
+        self.levels[MAX_ZOOM] = finest
+
+        # Walk up the hierarchy: a cell at zoom z is the union of its four children at z+1
+        for zoom in range(MAX_ZOOM - 1, MIN_ZOOM - 1, -1):
+            parents = {}
+            for (x, y), child in self.levels[zoom + 1].items():
+                key = (x >> 1, y >> 1)
+                parent = parents.get(key)
+                if parent is None:
+                    parent = parents[key] = self._empty_cell()
+                self._merge(parent, child)
+            self.levels[zoom] = parents
+
+    def query(self, zoom, bbox=None):
+        """
+        Returns the clusters at the given zoom (clamped to the precomputed range).
+        bbox is (min_lon, min_lat, max_lon, max_lat); None means the whole snapshot.
+        """
+        zoom = max(MIN_ZOOM, min(MAX_ZOOM, int(zoom)))
+        cells = self.levels.get(zoom, {})
+
+        if bbox is None:
+            selected = cells.items()
+        else:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            # Note that y grows southwards in tile space
+            min_x, min_y = self._cell_for(max_lat, min_lon, zoom)
+            max_x, max_y = self._cell_for(min_lat, max_lon, zoom)
+            selected = [
+                (key, cell) for key, cell in cells.items()
+                if min_x <= key[0] <= max_x and min_y <= key[1] <= max_y
+            ]
+
+        clusters = [self._to_json(zoom, key, cell) for key, cell in selected]
+        return {
+            "generated_at": self.generated_at,
+            "zoom": zoom,
+            "clusters": clusters
+        }
+
+    def _cell_for(self, lat, lon, zoom):
+        """Converts a lat/lon into integer grid cell coordinates (Web Mercator) at a zoom level."""
+        n = (1 << zoom) * CELLS_PER_TILE
+        lat = max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, lat))
+        lat_rad = math.radians(lat)
+
+        x = int((lon + 180.0) / 360.0 * n)
+        y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+
+        # Clamp so points on the antimeridian / poles still land in a valid cell
+        return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+    def _empty_cell(self):
+        return {
+            "count": 0,
+            "lat_sum": 0.0,
+            "lon_sum": 0.0,
+            "status": {s: 0 for s in STATUSES}
+        }
+
+    def _add_vehicle(self, cell, v, lat, lon):
+        status = v.get('on_time_status')
+        if status not in cell["status"]:
+            status = 'UNKNOWN'
+
+        cell["count"] += 1
+        cell["lat_sum"] += lat
+        cell["lon_sum"] += lon
+        cell["status"][status] += 1
+
+    def _merge(self, parent, child):
+        parent["count"] += child["count"]
+        parent["lat_sum"] += child["lat_sum"]
+        parent["lon_sum"] += child["lon_sum"]
+        for status, count in child["status"].items():
+            parent["status"][status] += count
+
+    def _to_json(self, zoom, key, cell):
+        count = cell["count"]
+        return {
+            "id": f"{zoom}/{key[0]}/{key[1]}",
+            "lat": cell["lat_sum"] / count,
+            "lon": cell["lon_sum"] / count,
+            "count": count,
+            "status": dict(cell["status"])
+        }
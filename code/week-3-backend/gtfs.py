@@ -6,6 +6,20 @@ import math
 import pandas as pd
 from datetime import datetime, timedelta, timezone
 
+def haversine_distance(lat1, lon1, lat2, lon2):
+    # Simple distance approximation
+    R = 6371000 # meters
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+    
+    a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2) * math.sin(dlambda/2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    
+    return R * c
+
+
 class GTFSStaticRepository:
     """
     Handles downloading and loading the static GTFS files (stops, trips, etc) into memory.
@@ -160,7 +174,7 @@ class TripEstimator:
             if not stop_info:
                 continue
                 
-            dist = self._haversine_distance(lat, lon, stop_info['stop_lat'], stop_info['stop_lon'])
+            dist = haversine_distance(lat, lon, stop_info['stop_lat'], stop_info['stop_lon'])
             
             if dist < min_dist:
                 min_dist = dist
@@ -173,6 +187,7 @@ class TripEstimator:
 
         if closest_stop:
             v['next_stop_name'] = closest_stop['stop_name']
+            v['stop_sequence'] = int(closest_stop['stop_sequence']) # Used to order vehicles along a route
             
             scheduled_time_str = closest_stop['arrival_time']
             delay_seconds = self._calculate_delay(scheduled_time_str, now)
@@ -235,16 +250,3 @@ class TripEstimator:
             
         except Exception:
             return 0
-
-    def _haversine_distance(self, lat1, lon1, lat2, lon2):
-        # Simple distance approximation
-        R = 6371000 # meters
-        phi1 = math.radians(lat1)
-        phi2 = math.radians(lat2)
-        dphi = math.radians(lat2 - lat1)
-        dlambda = math.radians(lon2 - lon1)
-        
-        a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2) * math.sin(dlambda/2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        
-        return R * c
@@ -0,0 +1,209 @@
+import math
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+from gtfs import haversine_distance
+
+# Rolling window the per-route statistics cover, split into fixed-size slots.
+# Old slots fall off the end of a ring buffer so memory per route stays constant.
+WINDOW_SECONDS = 15 * 60
+SLOT_SECONDS = 60
+
+# Delay histogram used as a streaming quantile sketch. Delays outside the range are
+# clamped into the edge bins, which is fine for a p90 of bus delays.
+DELAY_BIN_SECONDS = 30
+DELAY_MIN_SECONDS = -30 * 60
+DELAY_MAX_SECONDS = 90 * 60
+
+# Two consecutive vehicles on the same route/direction closer than this are "bunched"
+BUNCHING_DISTANCE_M = 400
+
+
+class DelaySketch:
+    """
+    Fixed-width histogram of delays. Can be merged and queried for approximate
+    quantiles, and never holds more than a few hundred counters.
+    """
+    def __init__(self):
+        self.bins = {}
+        self.count = 0
+
+    def add(self, delay_seconds):
+        delay = max(DELAY_MIN_SECONDS, min(DELAY_MAX_SECONDS, delay_seconds))
+        idx = int(math.floor(delay / DELAY_BIN_SECONDS))
+        self.bins[idx] = self.bins.get(idx, 0) + 1
+        self.count += 1
+
+    def merge(self, other):
+        for idx, count in other.bins.items():
+            self.bins[idx] = self.bins.get(idx, 0) + count
+        self.count += other.count
+
+    def quantile(self, q):
+        """Returns the approximate q-quantile as the lower edge of the matching bin."""
+        if self.count == 0:
+            return None
+
+        target = q * self.count
+        seen = 0
+        for idx in sorted(self.bins):
+            seen += self.bins[idx]
+            if seen >= target:
+                return idx * DELAY_BIN_SECONDS
+        return None
+
+
+class _Slot:
+    """Everything observed for one route during one SLOT_SECONDS interval."""
+    def __init__(self, start):
+        self.start = start
+        self.samples = 0
+        self.delay_sum = 0
+        self.late = 0
+        self.sketch = DelaySketch()
+        self.gap_pairs = 0
+        self.bunched_pairs = 0
+
+
+class RouteStatsAggregator:
+    """
+    Keeps rolling per-route performance statistics, updated incrementally from each
+    snapshot coming out of handle_new_data instead of recomputed from raw history.
+    """
+    def __init__(self, window_seconds=WINDOW_SECONDS, slot_seconds=SLOT_SECONDS):
+        self.window_seconds = window_seconds
+        self.slot_seconds = slot_seconds
+        self.max_slots = max(1, window_seconds // slot_seconds)
+        self.generated_at = None
+        self.slots = {}       # route_id -> deque of _Slot (ring buffer)
+        self.headways = {}    # route_id -> latest headway info per direction
+        self.route_names = {}
+        self._lock = threading.Lock()
+
+    def update(self, vehicles, now=None):
+        """Folds a snapshot of enriched vehicles into the rolling window."""
+        now = now or datetime.now(timezone.utc)
+        ts = now.timestamp()
+        slot_start = int(ts // self.slot_seconds) * self.slot_seconds
+
+        # Group by route and direction (headsign) for this snapshot
+        by_route = {}
+        for v in vehicles:
+            route_id = v.get('route_id')
+            if not route_id:
+                continue
+            by_route.setdefault(route_id, {}).setdefault(v.get('headsign'), []).append(v)
+
+        with self._lock:
+            for route_id, directions in by_route.items():
+                slot = self._current_slot(route_id, slot_start)
+                headways = {}
+
+                for headsign, route_vehicles in directions.items():
+                    for v in route_vehicles:
+                        if v.get('route_short_name'):
+                            self.route_names[route_id] = v['route_short_name']
+
+                        delay = v.get('delay_seconds')
+                        if delay is None:
+                            continue
+                        slot.samples += 1
+                        slot.delay_sum += delay
+                        slot.sketch.add(delay)
+                        if v.get('on_time_status') == 'LATE':
+                            slot.late += 1
+
+                    gaps = self._headway_gaps(route_vehicles)
+                    bunched = sum(1 for g in gaps if g < BUNCHING_DISTANCE_M)
+                    slot.gap_pairs += len(gaps)
+                    slot.bunched_pairs += bunched
+
+                    headways[headsign] = {
+                        "headsign": headsign,
+                        "vehicle_count": len(route_vehicles),
+                        "min_gap_m": round(min(gaps)) if gaps else None,
+                        "max_gap_m": round(max(gaps)) if gaps else None,
+                        "mean_gap_m": round(sum(gaps) / len(gaps)) if gaps else None,
+                        "bunched_pairs": bunched
+                    }
+
+                self.headways[route_id] = headways
+
+            # Routes that no longer appear only keep their old slots until they expire
+            for route_id in list(self.slots):
+                if route_id not in by_route:
+                    self.headways.pop(route_id, None)
+                if not self._live_slots(route_id, ts):
+                    del self.slots[route_id]
+                    self.route_names.pop(route_id, None)
+
+            self.generated_at = now.isoformat()
+
+    def summary(self, now=None):
+        """Returns the rolling statistics for every route seen in the window."""
+        ts = (now or datetime.now(timezone.utc)).timestamp()
+        routes = []
+
+        with self._lock:
+            for route_id in self.slots:
+                live = self._live_slots(route_id, ts)
+                if not live:
+                    continue
+
+                sketch = DelaySketch()
+                samples = delay_sum = late = gap_pairs = bunched_pairs = 0
+                for slot in live:
+                    sketch.merge(slot.sketch)
+                    samples += slot.samples
+                    delay_sum += slot.delay_sum
+                    late += slot.late
+                    gap_pairs += slot.gap_pairs
+                    bunched_pairs += slot.bunched_pairs
+
+                directions = list(self.headways.get(route_id, {}).values())
+                routes.append({
+                    "route_id": route_id,
+                    "route_short_name": self.route_names.get(route_id),
+                    "vehicle_count": sum(d["vehicle_count"] for d in directions),
+                    "samples": samples,
+                    "mean_delay_seconds": round(delay_sum / samples) if samples else None,
+                    "p90_delay_seconds": sketch.quantile(0.9),
+                    "late_share": round(late / samples, 3) if samples else None,
+                    "bunching_share": round(bunched_pairs / gap_pairs, 3) if gap_pairs else None,
+                    "directions": directions
+                })
+
+            generated_at = self.generated_at
+
+        routes.sort(key=lambda r: str(r["route_short_name"] or r["route_id"]))
+        return {
+            "generated_at": generated_at,
+            "window_seconds": self.window_seconds,
+            "routes": routes
+        }
+
+    def _current_slot(self, route_id, slot_start):
+        slots = self.slots.get(route_id)
+        if slots is None:
+            slots = self.slots[route_id] = deque(maxlen=self.max_slots)
+        if not slots or slots[-1].start != slot_start:
+            slots.append(_Slot(slot_start))
+        return slots[-1]
+
+    def _live_slots(self, route_id, ts):
+        cutoff = ts - self.window_seconds
+        return [s for s in self.slots.get(route_id, ()) if s.start > cutoff]
+
+    def _headway_gaps(self, route_vehicles):
+        """Distances (m) between consecutive vehicles, ordered by progress along the trip."""
+        ordered = sorted(
+            (v for v in route_vehicles
+             if v.get('stop_sequence') is not None and v.get('lat') and v.get('lon')),
+            key=lambda v: v['stop_sequence']
+        )
+        return [
+            haversine_distance(a['lat'], a['lon'], b['lat'], b['lon'])
+            for a, b in zip(ordered, ordered[1:])
+        ]
+